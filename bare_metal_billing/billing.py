@@ -1,19 +1,21 @@
 import csv
-import math
+import functools
 import logging
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 from dataclasses import dataclass
+from typing import TextIO
 
 from bare_metal_billing import models
 
 
-BM_SU_LIST = [
+BM_SU_LIST = (
     "BM FC430",
     "BM FC830",
     "BM GPUA100SXM4",
     "BM GPUH100",
-]
+)
+_BM_SU_SET = frozenset(BM_SU_LIST)
 
 RESOURCE_CLASS_2_SU_MAPPING = {
     "lenovo-sd665nv3-h100": "BM GPUH100",
@@ -25,12 +27,17 @@ RESOURCE_CLASS_2_SU_MAPPING = {
 
 SU_RESOURCE_LIST = ["vCPUs", "RAM", "GPUs"]
 
+# Unknown SU types are not billed
+UNKNOWN_SU_RATE = Decimal(0)
+
+ONE_HOUR = timedelta(hours=1)
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class InvoiceWriter:
     HEADERS = [
         "Invoice Month",
@@ -47,87 +54,98 @@ class InvoiceWriter:
         "Rate",
         "Cost",
     ]
+    WRITE_BUFFER_SIZE = 1024 * 1024
 
     invoice_month: str
     project_invoices: list[models.ProjectUsage]
     su_rates: models.SURates
-    output_file: str
+    output_file: str | TextIO
 
-    def write_csv(self):
-        csv_rows = [self.HEADERS]
+    def _iter_rows(self):
+        invoice_month = self.invoice_month
+        rates_get = self.su_rates.root.get
         for project_invoice in self.project_invoices:
+            project_name = project_invoice.project_name
             for su_type, su_hour in project_invoice.su_hours.items():
-                csv_rows.append(
-                    (
-                        self.invoice_month,
-                        project_invoice.project_name,
-                        project_invoice.project_name,
-                        "",
-                        "bm",  # Cluster Name
-                        "",
-                        "",
-                        "",
-                        "",
-                        su_hour,
-                        su_type,
-                        self.su_rates.root.get(
-                            su_type, Decimal(0)
-                        ),  # Unknown SU types are not billed
-                        self.su_rates.root.get(su_type, Decimal(0)) * su_hour,
-                    )
+                rate = rates_get(su_type, UNKNOWN_SU_RATE)
+                yield (
+                    invoice_month,
+                    project_name,
+                    project_name,
+                    "",
+                    "bm",  # Cluster Name
+                    "",
+                    "",
+                    "",
+                    "",
+                    su_hour,
+                    su_type,
+                    rate,
+                    rate * su_hour,
                 )
 
-        with open(self.output_file, "w") as csvfile:
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerows(csv_rows)
+    def _write_rows(self, csvfile: TextIO):
+        csvwriter = csv.writer(csvfile)
+        csvwriter.writerow(self.HEADERS)
+        csvwriter.writerows(self._iter_rows())
+
+    def write_csv(self):
+        # Already open file-like objects are written to as is
+        if hasattr(self.output_file, "write"):
+            self._write_rows(self.output_file)
+            return
+
+        with open(
+            self.output_file, "w", newline="", buffering=self.WRITE_BUFFER_SIZE
+        ) as csvfile:
+            self._write_rows(csvfile)
 
 
-def _get_su_type(lease_info: models.BMNodeUsage):
-    rc = lease_info.resource_class
-    return RESOURCE_CLASS_2_SU_MAPPING.get(rc, rc)
+@functools.lru_cache(maxsize=32)
+def _get_su_type(resource_class: str):
+    return RESOURCE_CLASS_2_SU_MAPPING.get(resource_class, resource_class)
 
 
 def _get_running_time(
     lease_info: models.BMNodeUsage, start_time: datetime, end_time: datetime
 ):
-    start_time = _clamp_time(lease_info.start_time, start_time, end_time)
-    end_time = (
+    lease_start = max(lease_info.start_time, start_time)
+    lease_end = (
         end_time
         if lease_info.expire_time
         is None  # Assumes lease is still running if no expire time given
-        else _clamp_time(lease_info.expire_time, start_time, end_time)
+        else min(lease_info.expire_time, end_time)
     )
-    return math.ceil((end_time - start_time).total_seconds() / 3600)
-
-
-def _clamp_time(time, min_time, max_time):
-    if time < min_time:
-        time = min_time
-    if time > max_time:
-        time = max_time
-    return time
+    if lease_end <= lease_start:
+        return 0
+    # Ceiling division on timedeltas stays exact, without a float round trip
+    return -((lease_start - lease_end) // ONE_HOUR)
 
 
 def get_project_invoices(
     bm_usage_data: models.BMUsageData, start_time: datetime, end_time: datetime
 ) -> list[models.ProjectUsage]:
-    project_usage_dict = {}
+    project_su_hours: dict[str, dict[str, int]] = {}
     for lease_info in bm_usage_data.root:
         project_name = lease_info.project
         if project_name == "":
-            logger.error(f"Lease {lease_info.uuid} has empty project name.")
+            logger.error("Lease %s has empty project name.", lease_info.uuid)
 
-        project_usage_dict.setdefault(
-            project_name, models.ProjectUsage(project_name=project_name, su_hours={})
-        )
-
-        su_type = _get_su_type(lease_info)
-        if su_type not in BM_SU_LIST:
+        su_type = _get_su_type(lease_info.resource_class)
+        if su_type not in _BM_SU_SET:
             logger.warning(
-                f"Unknown resource class {lease_info.resource_class} (resource {lease_info.resource}) in lease {lease_info.uuid}."
+                "Unknown resource class %s (resource %s) in lease %s.",
+                lease_info.resource_class,
+                lease_info.resource,
+                lease_info.uuid,
             )
         su_hours = _get_running_time(lease_info, start_time, end_time)
 
-        project_usage_dict[project_name].add_usage(su_type, su_hours)
+        project_hours = project_su_hours.setdefault(project_name, {})
+        project_hours[su_type] = project_hours.get(su_type, 0) + su_hours
 
-    return list(project_usage_dict.values())
+    # Validate once per project rather than once per lease
+    return [
+        models.ProjectUsage(project_name=project_name, su_hours=su_hours)
+        for project_name, su_hours in project_su_hours.items()
+    ]
@@ -7,3 +7,7 @@ S3_LEASE_ENDPOINT_URL = os.getenv(
 S3_LEASE_KEY_ID = os.getenv("S3_LEASE_KEY_ID")
 S3_LEASE_APP_KEY = os.getenv("S3_LEASE_APP_KEY")
 S3_LEASE_BUCKET = os.getenv("S3_LEASE_BUCKET")
+
+# Optional local cache of downloaded lease files, keyed by S3 ETag.
+# Disabled unless set, e.g. to ~/.cache/bare-metal-billing.
+S3_LEASE_CACHE_DIR = os.path.expanduser(os.getenv("S3_LEASE_CACHE_DIR", ""))
@@ -1,6 +1,5 @@
 from decimal import Decimal
 from datetime import datetime, timedelta
-import json
 import argparse
 import logging
 
@@ -36,13 +35,17 @@ def default_end_argument():
 
 
 def main():
+    # Derive every default from the same instant
+    default_start = default_start_argument()
+    default_end = default_end_argument()
+
     parser = argparse.ArgumentParser(
         prog="python -m bare_metal_billing.main",
         description="Simple Bare Metal Invoicing",
     )
     parser.add_argument(
         "--start",
-        default=default_start_argument(),
+        default=default_start,
         type=parse_time_argument,
         help=(
             "Start of the invoicing period. (YYYY-MM-DD)."
@@ -52,7 +55,7 @@ def main():
     )
     parser.add_argument(
         "--end",
-        default=default_end_argument(),
+        default=default_end,
         type=parse_time_argument,
         help=(
             "End of the invoicing period. (YYYY-MM-DD)."
@@ -61,7 +64,7 @@ def main():
     )
     parser.add_argument(
         "--invoice-month",
-        default=default_start_argument().strftime("%Y-%m"),
+        default=default_start.strftime("%Y-%m"),
         help=(
             "Use the first column for Invoice Month, rather than Interval."
             " Defaults to month of start. (YYYY-MM)."
@@ -113,7 +116,7 @@ def main():
     if args.bm_usage_file:
         bm_usage_file = args.bm_usage_file
     else:
-        previous_day = (default_end_argument() - timedelta(days=1)).strftime("%Y%m%d")
+        previous_day = (default_end - timedelta(days=1)).strftime("%Y%m%d")
         bm_usage_file = s3_bucket.fetch_s3(
             config.S3_LEASE_BUCKET,
             f"{args.invoice_month}/esi-lease-{previous_day}.json",
@@ -137,10 +140,9 @@ def main():
         su_rates_dict,
     )
 
-    with open(bm_usage_file, "r") as f:
-        input_bm_json = json.load(f)
-
-    input_invoice = models.BMUsageData.model_validate(input_bm_json)
+    # Let pydantic-core parse and validate the raw bytes in a single pass
+    with open(bm_usage_file, "rb") as f:
+        input_invoice = models.BMUsageData.model_validate_json(f.read())
     project_invoices = billing.get_project_invoices(input_invoice, args.start, args.end)
 
     invoice_writer = billing.InvoiceWriter(
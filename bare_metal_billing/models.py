@@ -20,8 +20,11 @@ PositiveDecimalField = Annotated[Decimal, pydantic.Field(ge=0)]
 PositiveIntField = Annotated[int, pydantic.Field(gt=-1)]
 DateField = Annotated[datetime.datetime, pydantic.BeforeValidator(parse_date)]
 
+_POSITIVE_INT_ADAPTER = pydantic.TypeAdapter(PositiveIntField)
 
-class BMNodeUsage(pydantic.BaseModel):
+
+# Lease dumps carry many more fields than billing needs; they are dropped
+class BMNodeUsage(pydantic.BaseModel, extra="ignore"):
     uuid: Annotated[str, pydantic.Field(alias="UUID")]
     resource: Annotated[str, pydantic.Field(alias="Resource")]
     resource_class: Annotated[str, pydantic.Field(alias="Resource Class")]
@@ -30,22 +33,23 @@ class BMNodeUsage(pydantic.BaseModel):
     expire_time: Annotated[DateField | None, pydantic.Field(alias="Expire Time")] = None
 
 
+def _has_valid_expire_time(node_usage: BMNodeUsage) -> bool:
+    if node_usage.expire_time and node_usage.expire_time < node_usage.start_time:
+        logger.warning(
+            "Ignoring node lease with Expire Time before Start Time: UUID %s",
+            node_usage.uuid,
+        )
+        return False
+    return True
+
+
 class BMUsageData(pydantic.RootModel):
     root: list[BMNodeUsage]
 
-    @pydantic.model_validator(mode="after")
-    def validate_expire_time(self):
-        validated_list = []
-        for node_usage in self.root:
-            if node_usage.expire_time:
-                if node_usage.expire_time < node_usage.start_time:
-                    logger.warning(
-                        f"Ignoring node lease with Expire Time before Start Time: UUID {node_usage.uuid}"
-                    )
-                    continue
-            validated_list.append(node_usage)
-        self.root = validated_list
-        return self
+    @pydantic.field_validator("root", mode="after")
+    @classmethod
+    def validate_expire_time(cls, root: list[BMNodeUsage]) -> list[BMNodeUsage]:
+        return [node_usage for node_usage in root if _has_valid_expire_time(node_usage)]
 
 
 class ProjectUsage(pydantic.BaseModel, validate_assignment=True):
@@ -53,9 +57,10 @@ class ProjectUsage(pydantic.BaseModel, validate_assignment=True):
     su_hours: dict[str, PositiveIntField]
 
     def add_usage(self, su_type: str, hours: PositiveIntField):
-        if su_type not in self.su_hours:
-            self.su_hours[su_type] = 0
-        self.su_hours[su_type] += hours
+        # Validate only the added hours, then update su_hours in place rather
+        # than revalidating the whole dict through assignment
+        hours = _POSITIVE_INT_ADAPTER.validate_python(hours)
+        self.su_hours[su_type] = self.su_hours.get(su_type, 0) + hours
 
 
 class SURates(pydantic.RootModel):
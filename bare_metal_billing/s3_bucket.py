@@ -1,8 +1,16 @@
 import os
+import shutil
+import uuid
+import hashlib
 import logging
+import contextlib
 import functools
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from bare_metal_billing import config
 
@@ -10,25 +18,131 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-@functools.lru_cache
-def get_bucket(bucket_name: str):
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+)
+FETCH_MAX_WORKERS = 16
+COPY_BUFFER_SIZE = 1024 * 1024
+# One retry if the object changes between the cache's HEAD and GET
+CACHE_FETCH_ATTEMPTS = 2
+# total_max_attempts counts the first request, so this is 1 try plus 2 retries.
+# The pool fits every part request fetch_s3_many can have in flight at once.
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=FETCH_MAX_WORKERS * S3_TRANSFER_CONFIG.max_concurrency,
+    retries={"total_max_attempts": 3},
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_resource():
     if not config.S3_LEASE_APP_KEY or not config.S3_LEASE_KEY_ID:
         raise RuntimeError(
             "Please set the environment variables S3_LEASE_APP_KEY, S3_LEASE_KEY_ID"
         )
 
-    s3_resource = boto3.resource(
+    return boto3.resource(
         service_name="s3",
         endpoint_url=config.S3_LEASE_ENDPOINT_URL,
         aws_access_key_id=config.S3_LEASE_KEY_ID,
         aws_secret_access_key=config.S3_LEASE_APP_KEY,
+        config=S3_CLIENT_CONFIG,
     )
 
-    return s3_resource.Bucket(bucket_name)
 
+@functools.lru_cache
+def get_bucket(bucket_name: str):
+    return _get_resource().Bucket(bucket_name)
 
-def fetch_s3(bucket_name: str, s3_filepath: str) -> str:
+
+def _write_atomically(path: str, fileobj):
+    # Stream into a sibling temporary file and rename it into place, as
+    # download_file does, so an interrupted write never leaves a truncated file
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, COPY_BUFFER_SIZE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def _get_cache_path(bucket_name: str, s3_filepath: str, etag: str) -> str:
+    etag = etag.strip('"')
+    path_hash = hashlib.sha1(s3_filepath.encode()).hexdigest()
+    return os.path.join(config.S3_LEASE_CACHE_DIR, bucket_name, f"{path_hash}.{etag}")
+
+
+def _is_precondition_failed(error: ClientError) -> bool:
+    return (
+        error.response.get("Error", {}).get("Code") == "PreconditionFailed"
+        or error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 412
+    )
+
+
+def _fetch_cached(s3_client, bucket_name: str, s3_filepath: str) -> str:
+    for attempt in range(CACHE_FETCH_ATTEMPTS):
+        etag = s3_client.head_object(Bucket=bucket_name, Key=s3_filepath)["ETag"]
+        cache_path = _get_cache_path(bucket_name, s3_filepath, etag)
+        if os.path.exists(cache_path):
+            logger.info("Using cached copy of %s from %s.", s3_filepath, cache_path)
+            return cache_path
+
+        # IfMatch makes S3 refuse the GET if the object changed since the HEAD,
+        # so the cached bytes always belong to the ETag in the cache file name.
+        # download_file does not accept IfMatch, hence get_object.
+        try:
+            response = s3_client.get_object(
+                Bucket=bucket_name, Key=s3_filepath, IfMatch=etag
+            )
+        except ClientError as e:
+            if not _is_precondition_failed(e) or attempt + 1 == CACHE_FETCH_ATTEMPTS:
+                raise
+            # Overwritten between the HEAD and the GET; look up the new ETag
+            logger.info("%s changed while being fetched, retrying.", s3_filepath)
+            continue
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        _write_atomically(cache_path, response["Body"])
+        return cache_path
+
+
+# Takes the low-level client rather than a Bucket, since boto3 resources are
+# not thread-safe and fetch_s3_many calls this from worker threads.
+def _download(s3_client, bucket_name: str, s3_filepath: str) -> str:
     local_name = os.path.basename(s3_filepath)
-    lease_bucket = get_bucket(bucket_name)
-    lease_bucket.download_file(s3_filepath, local_name)
+    if not config.S3_LEASE_CACHE_DIR:
+        s3_client.download_file(
+            bucket_name, s3_filepath, local_name, Config=S3_TRANSFER_CONFIG
+        )
+        return local_name
+
+    with open(_fetch_cached(s3_client, bucket_name, s3_filepath), "rb") as f:
+        _write_atomically(local_name, f)
     return local_name
+
+
+def fetch_s3(bucket_name: str, s3_filepath: str) -> str:
+    return _download(get_bucket(bucket_name).meta.client, bucket_name, s3_filepath)
+
+
+def fetch_s3_many(bucket_name: str, s3_filepaths: list[str]) -> list[str]:
+    # Files are saved under their basename, so keys sharing one would race to
+    # write the same local file and all but one object would be lost
+    local_names = [os.path.basename(s3_filepath) for s3_filepath in s3_filepaths]
+    if len(set(local_names)) != len(local_names):
+        raise ValueError(
+            f"S3 paths must have distinct file names to be fetched together: {s3_filepaths}"
+        )
+
+    s3_client = get_bucket(bucket_name).meta.client
+    # Downloads are latency bound, so overlap them; local names keep input order
+    with ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS) as executor:
+        return list(
+            executor.map(
+                functools.partial(_download, s3_client, bucket_name), s3_filepaths
+            )
+        )
@@ -1,11 +1,17 @@
+import io
 import tempfile
-from unittest import TestCase
+from itertools import repeat
+from unittest import TestCase, mock
+from decimal import Decimal
 from datetime import datetime
 
+import pydantic
+
 from bare_metal_billing import billing, models
 
 
 HOURS_IN_DAY = 24
+PROJECT_USAGE_LIST_ADAPTER = pydantic.TypeAdapter(list[models.ProjectUsage])
 
 
 class BillingTestBase(TestCase):
@@ -14,17 +20,15 @@ class BillingTestBase(TestCase):
         project_names,
         su_hours=None,
     ):
-        if not su_hours:
-            su_hours = [{}] * len(project_names)
         project_invoice_list = []
-        for i in range(len(project_names)):
+        for project_name, project_su_hours in zip(
+            project_names, su_hours or repeat({})
+        ):
             project_invoice_list.append(
-                models.ProjectUsage.model_validate(
-                    {"project_name": project_names[i], "su_hours": su_hours[i]}
-                )
+                {"project_name": project_name, "su_hours": project_su_hours}
             )
 
-        return project_invoice_list
+        return PROJECT_USAGE_LIST_ADAPTER.validate_python(project_invoice_list)
 
 
 class TestInvoiceWriter(BillingTestBase):
@@ -54,20 +58,58 @@ class TestInvoiceWriter(BillingTestBase):
             "2025-01,P2,P2,,bm,,,,,240,SU Unknown,0,0\n"  # Precision is preserved
         )
 
+        # newline=None translates the csv module's \r\n line endings
+        output = io.StringIO(newline=None)
+        invoice_writer = billing.InvoiceWriter(
+            test_invoice_month,
+            test_project_invoice_list,
+            self.TEST_SU_RATES,
+            output,
+        )
+        invoice_writer.write_csv()
+        self.assertEqual(output.getvalue(), answer_invoice)
+
+    def test_write_csv_rate_precision(self):
+        """Costs are computed exactly, whatever the precision of the rate"""
+        test_su_rates = models.SURates({"SU 1": Decimal("0.0123456789")})
+        test_project_invoice_list = self._get_project_invoice_list(
+            ["P1"], [{"SU 1": 7}]
+        )
+        answer_row = "2025-01,P1,P1,,bm,,,,,7,SU 1,0.0123456789,0.0864197523\n"
+
         with tempfile.NamedTemporaryFile(mode="w+") as tmp:
             invoice_writer = billing.InvoiceWriter(
-                test_invoice_month,
+                "2025-01",
                 test_project_invoice_list,
-                self.TEST_SU_RATES,
+                test_su_rates,
                 tmp.name,
             )
             invoice_writer.write_csv()
-            self.assertEqual(tmp.read(), answer_invoice)
+            self.assertEqual(tmp.readlines()[1], answer_row)
+
+    def test_write_csv_quoting(self):
+        """Project names with commas or quotes are escaped"""
+        test_project_invoice_list = self._get_project_invoice_list(
+            ['P1, "Lab"'], [{"SU 1": 2}]
+        )
+        answer_row = '2025-01,"P1, ""Lab""","P1, ""Lab""",,bm,,,,,2,SU 1,1.5,3.0\n'
+
+        output = io.StringIO(newline=None)
+        invoice_writer = billing.InvoiceWriter(
+            "2025-01",
+            test_project_invoice_list,
+            self.TEST_SU_RATES,
+            output,
+        )
+        invoice_writer.write_csv()
+        self.assertEqual(output.getvalue().splitlines(keepends=True)[1], answer_row)
 
 
 class TestProjectUsage(BillingTestBase):
     start_time = datetime(year=2000, month=1, day=1, hour=0, minute=0, second=0)
     end_time = datetime(year=2000, month=2, day=1, hour=0, minute=0, second=0)
+    default_lease_start = datetime(2000, 1, 1, 0, 0, 0)
+    default_lease_expire = datetime(2000, 1, 2, 0, 0, 0)
 
     def _get_bm_usage_data(
         self,
@@ -76,25 +118,22 @@ class TestProjectUsage(BillingTestBase):
         expire_times=None,
         resource_classes=None,
     ):
-        if not start_times:
-            start_times = [datetime(2000, 1, 1, 0, 0, 0)] * len(projects)
-        if not expire_times:
-            expire_times = [datetime(2000, 1, 2, 0, 0, 0)] * len(projects)
-        if not resource_classes:
-            resource_classes = ["UKNOWN"] * len(projects)
         bm_usage_list = []
-        for i in range(len(projects)):
+        for project, start_time, expire_time, resource_class in zip(
+            projects,
+            start_times or repeat(self.default_lease_start),
+            expire_times or repeat(self.default_lease_expire),
+            resource_classes or repeat("UKNOWN"),
+        ):
             bm_usage_list.append(
-                models.BMNodeUsage.model_validate(
-                    {
-                        "UUID": "uuid",
-                        "Project": projects[i],
-                        "Resource": "r",
-                        "Resource Class": resource_classes[i],
-                        "Start Time": start_times[i],
-                        "Expire Time": expire_times[i],
-                    }
-                )
+                {
+                    "UUID": "uuid",
+                    "Project": project,
+                    "Resource": "r",
+                    "Resource Class": resource_class,
+                    "Start Time": start_time,
+                    "Expire Time": expire_time,
+                }
             )
 
         return models.BMUsageData.model_validate(bm_usage_list)
@@ -178,15 +217,17 @@ class TestProjectUsage(BillingTestBase):
             ["P1"], [{"ChickFilA": HOURS_IN_DAY * 1, "Popeyes": HOURS_IN_DAY * 3}]
         )
 
-        with self.assertLogs(level="WARNING") as log:
+        with mock.patch.object(billing.logger, "warning") as warn:
             output_project_invoices = billing.get_project_invoices(
                 test_usage_data, self.start_time, self.end_time
             )
 
         self.assertEqual(output_project_invoices, answer_project_invoices)
-        self.assertIn(
-            "WARNING:bare_metal_billing.billing:Unknown resource class ChickFilA (resource r) in lease uuid.",
-            log.output,
+        warn.assert_any_call(
+            "Unknown resource class %s (resource %s) in lease %s.",
+            "ChickFilA",
+            "r",
+            "uuid",
         )
 
     def test_get_su_type(self):
@@ -209,7 +250,10 @@ class TestProjectUsage(BillingTestBase):
             "dummy",
         )
         for i, project_invoice in enumerate(test_bm_usage_data.root):
-            self.assertEqual(billing._get_su_type(project_invoice), answer_su_types[i])
+            self.assertEqual(
+                billing._get_su_type(project_invoice.resource_class),
+                answer_su_types[i],
+            )
 
     def test_get_su_hours(self):
         # SU hours always rounded up
@@ -226,3 +270,16 @@ class TestProjectUsage(BillingTestBase):
             ),
             4,
         )
+
+    def test_get_su_hours_outside_period(self):
+        # Leases entirely outside the billing period are not billed
+        test_bm_usage_data = self._get_bm_usage_data(
+            ["P1", "P2"],
+            start_times=[datetime(1999, 12, 1, 0, 0, 0), datetime(2000, 2, 2, 0, 0, 0)],
+            expire_times=[datetime(1999, 12, 31, 0, 0, 0), None],
+        )
+        for lease_info in test_bm_usage_data.root:
+            self.assertEqual(
+                billing._get_running_time(lease_info, self.start_time, self.end_time),
+                0,
+            )
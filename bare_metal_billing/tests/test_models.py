@@ -1,8 +1,9 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 from datetime import datetime
 
 import pydantic
 
+from bare_metal_billing import models
 from bare_metal_billing.models import BMUsageData, ProjectUsage
 
 
@@ -90,6 +91,7 @@ class TestBMUsageData(TestCase):
 
         data_model = BMUsageData.model_validate(test_usage_data)
         node_1_info = data_model.root[0]
+        self.assertIsNone(node_1_info.model_extra)  # Unused fields are not kept
         properties_to_check = [
             (node_1_info.resource_class, "rc1"),
             (node_1_info.project, "P1"),
@@ -154,13 +156,12 @@ class TestBMUsageData(TestCase):
             },
         ]
 
-        with self.assertLogs(level="WARNING") as log:
+        with mock.patch.object(models.logger, "warning") as warn:
             data_model = BMUsageData.model_validate(test_usage_data)
 
         self.assertEqual(len(data_model.root), 1)
-        self.assertIn(
-            "WARNING:bare_metal_billing.models:Ignoring node lease with Expire Time before Start Time: UUID uuid2",
-            log.output,
+        warn.assert_called_once_with(
+            "Ignoring node lease with Expire Time before Start Time: UUID %s", "uuid2"
         )
         node_info = data_model.root[0]
         properties_to_check = [
@@ -179,6 +180,27 @@ class TestBMUsageData(TestCase):
         for node_attr, answer in properties_to_check:
             self.assertEqual(node_attr, answer)
 
+    def test_validate_json(self):
+        """Raw JSON bytes are parsed and filtered like decoded data"""
+        test_usage_json = (
+            b'[{"UUID": "uuid1", "Resource": "r1", "Resource Class": "rc1",'
+            b' "Project": "P1", "Start Time": "2024-01-01T01:01:01",'
+            b' "Expire Time": null},'
+            b' {"UUID": "uuid2", "Resource": "r2", "Resource Class": "rc2",'
+            b' "Project": "P2", "Start Time": "2024-01-01T01:01:01",'
+            b' "Expire Time": "2023-01-01T01:01:01"}]'
+        )
+
+        with mock.patch.object(models.logger, "warning") as warn:
+            data_model = BMUsageData.model_validate_json(test_usage_json)
+
+        warn.assert_called_once()
+
+        self.assertEqual(len(data_model.root), 1)
+        node_info = data_model.root[0]
+        self.assertEqual(node_info.start_time, datetime(2024, 1, 1, 1, 1, 1))
+        self.assertIsNone(node_info.expire_time)
+
 
 class TestProjectUsage(TestCase):
     def test_valid_project_usage(self):
@@ -212,6 +234,18 @@ class TestProjectUsage(TestCase):
         with self.assertRaises(pydantic.ValidationError):
             ProjectUsage.model_validate(test_project_data)
 
+    def test_add_usage(self):
+        data_model = ProjectUsage.model_validate(
+            {"project_name": "P1", "su_hours": {"GPU1": 16}}
+        )
+        data_model.add_usage("GPU1", 4)
+        data_model.add_usage("GPU2", 8)
+        self.assertEqual(data_model.su_hours, {"GPU1": 20, "GPU2": 8})
+
+        with self.assertRaises(pydantic.ValidationError):
+            data_model.add_usage("GPU1", -40)
+        self.assertEqual(data_model.su_hours, {"GPU1": 20, "GPU2": 8})
+
     def test_invalid_reassignemnt(self):
         """Assignments to properties of ProjectUsage should also be validated"""
         test_project_data = {
@@ -1,9 +1,22 @@
+import io
+import os
+import hashlib
+import tempfile
+import contextlib
 from unittest import TestCase, mock
 
+from botocore.exceptions import ClientError
+
 from bare_metal_billing import s3_bucket
 
 
 class TestS3Bucket(TestCase):
+    def setUp(self):
+        # The cache is opt-in; keep it off even if the environment enables it
+        patcher = mock.patch("bare_metal_billing.config.S3_LEASE_CACHE_DIR", "")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_fetch_s3(self):
         mock_bucket = mock.MagicMock()
         mock_get_bucket = mock.MagicMock(return_value=mock_bucket)
@@ -16,6 +29,185 @@ class TestS3Bucket(TestCase):
 
             self.assertEqual(local_name, expected_local_name)
             mock_get_bucket.assert_called_once()
-            mock_bucket.download_file.assert_called_once_with(
-                test_s3_filepath, expected_local_name
+            mock_bucket.meta.client.download_file.assert_called_once_with(
+                "foo-bucket",
+                test_s3_filepath,
+                expected_local_name,
+                Config=s3_bucket.S3_TRANSFER_CONFIG,
             )
+            mock_bucket.meta.client.head_object.assert_not_called()
+
+    def test_fetch_s3_many(self):
+        mock_bucket = mock.MagicMock()
+        mock_get_bucket = mock.MagicMock(return_value=mock_bucket)
+
+        with mock.patch("bare_metal_billing.s3_bucket.get_bucket", mock_get_bucket):
+            test_s3_filepaths = [f"path/to/testfile{i}.json" for i in range(20)]
+            expected_local_names = [f"testfile{i}.json" for i in range(20)]
+
+            local_names = s3_bucket.fetch_s3_many("foo-bucket", test_s3_filepaths)
+
+            self.assertEqual(local_names, expected_local_names)
+            mock_get_bucket.assert_called_once_with("foo-bucket")
+            mock_client = mock_bucket.meta.client
+            self.assertEqual(
+                mock_client.download_file.call_count, len(test_s3_filepaths)
+            )
+            for s3_filepath, local_name in zip(test_s3_filepaths, local_names):
+                mock_client.download_file.assert_any_call(
+                    "foo-bucket",
+                    s3_filepath,
+                    local_name,
+                    Config=s3_bucket.S3_TRANSFER_CONFIG,
+                )
+
+    def test_fetch_s3_many_duplicate_names(self):
+        mock_bucket = mock.MagicMock()
+        mock_get_bucket = mock.MagicMock(return_value=mock_bucket)
+
+        with mock.patch("bare_metal_billing.s3_bucket.get_bucket", mock_get_bucket):
+            with self.assertRaises(ValueError):
+                s3_bucket.fetch_s3_many(
+                    "foo-bucket",
+                    ["2025-01/esi-lease-X.json", "2025-02/esi-lease-X.json"],
+                )
+
+            mock_bucket.meta.client.download_file.assert_not_called()
+
+    def test_fetch_s3_cache(self):
+        mock_bucket = mock.MagicMock()
+        mock_client = mock_bucket.meta.client
+        mock_client.head_object.return_value = {"ETag": '"etag1"'}
+        mock_client.get_object.side_effect = lambda **kwargs: {
+            "Body": io.BytesIO(b"[]")
+        }
+        mock_get_bucket = mock.MagicMock(return_value=mock_bucket)
+
+        with (
+            tempfile.TemporaryDirectory() as cache_dir,
+            tempfile.TemporaryDirectory() as work_dir,
+            contextlib.chdir(work_dir),
+            mock.patch("bare_metal_billing.config.S3_LEASE_CACHE_DIR", cache_dir),
+            mock.patch("bare_metal_billing.s3_bucket.get_bucket", mock_get_bucket),
+        ):
+            test_s3_filepath = "path/to/testfile.json"
+
+            for _ in range(2):
+                local_name = s3_bucket.fetch_s3("foo-bucket", test_s3_filepath)
+                self.assertEqual(local_name, "testfile.json")
+                with open(local_name) as f:
+                    self.assertEqual(f.read(), "[]")
+
+            # Second fetch of an unchanged object is served from the cache, and
+            # the one GET is pinned to the ETag used in the cache file name
+            mock_client.get_object.assert_called_once_with(
+                Bucket="foo-bucket", Key=test_s3_filepath, IfMatch='"etag1"'
+            )
+            mock_client.download_file.assert_not_called()
+            self.assertEqual(
+                os.listdir(os.path.join(cache_dir, "foo-bucket")),
+                [f"{hashlib.sha1(test_s3_filepath.encode()).hexdigest()}.etag1"],
+            )
+
+            # A new ETag means the object changed and is downloaded again
+            mock_client.head_object.return_value = {"ETag": '"etag2"'}
+            s3_bucket.fetch_s3("foo-bucket", test_s3_filepath)
+            self.assertEqual(mock_client.get_object.call_count, 2)
+            mock_client.get_object.assert_called_with(
+                Bucket="foo-bucket", Key=test_s3_filepath, IfMatch='"etag2"'
+            )
+
+            # An interrupted copy out of the cache keeps the previous local file
+            with open("testfile.json", "w") as f:
+                f.write("previous")
+            with (
+                mock.patch(
+                    "bare_metal_billing.s3_bucket.shutil.copyfileobj",
+                    side_effect=OSError,
+                ),
+                self.assertRaises(OSError),
+            ):
+                s3_bucket.fetch_s3("foo-bucket", test_s3_filepath)
+            self.assertEqual(os.listdir(work_dir), ["testfile.json"])
+            with open("testfile.json") as f:
+                self.assertEqual(f.read(), "previous")
+
+    def test_fetch_s3_cache_object_changed(self):
+        precondition_failed = ClientError(
+            {
+                "Error": {"Code": "PreconditionFailed"},
+                "ResponseMetadata": {"HTTPStatusCode": 412},
+            },
+            "GetObject",
+        )
+        mock_bucket = mock.MagicMock()
+        mock_client = mock_bucket.meta.client
+        mock_client.head_object.side_effect = [
+            {"ETag": '"etag1"'},
+            {"ETag": '"etag2"'},
+        ]
+        # Overwritten after the first HEAD, so the first GET fails its IfMatch
+        mock_client.get_object.side_effect = [
+            precondition_failed,
+            {"Body": io.BytesIO(b"[]")},
+        ]
+        mock_get_bucket = mock.MagicMock(return_value=mock_bucket)
+
+        with (
+            tempfile.TemporaryDirectory() as cache_dir,
+            tempfile.TemporaryDirectory() as work_dir,
+            contextlib.chdir(work_dir),
+            mock.patch("bare_metal_billing.config.S3_LEASE_CACHE_DIR", cache_dir),
+            mock.patch("bare_metal_billing.s3_bucket.get_bucket", mock_get_bucket),
+        ):
+            test_s3_filepath = "path/to/testfile.json"
+
+            local_name = s3_bucket.fetch_s3("foo-bucket", test_s3_filepath)
+
+            with open(local_name) as f:
+                self.assertEqual(f.read(), "[]")
+            self.assertEqual(
+                [c.kwargs["IfMatch"] for c in mock_client.get_object.call_args_list],
+                ['"etag1"', '"etag2"'],
+            )
+            self.assertEqual(
+                os.listdir(os.path.join(cache_dir, "foo-bucket")),
+                [f"{hashlib.sha1(test_s3_filepath.encode()).hexdigest()}.etag2"],
+            )
+
+            # Only one retry; an object that keeps changing fails the fetch
+            mock_client.head_object.side_effect = None
+            mock_client.head_object.return_value = {"ETag": '"etag3"'}
+            mock_client.get_object.reset_mock()
+            mock_client.get_object.side_effect = precondition_failed
+            with self.assertRaises(ClientError):
+                s3_bucket.fetch_s3("foo-bucket", test_s3_filepath)
+            self.assertEqual(
+                mock_client.get_object.call_count, s3_bucket.CACHE_FETCH_ATTEMPTS
+            )
+
+    def test_get_bucket_shares_resource(self):
+        mock_boto3_resource = mock.MagicMock()
+
+        with (
+            mock.patch(
+                "bare_metal_billing.s3_bucket.boto3.resource", mock_boto3_resource
+            ),
+            mock.patch.multiple(
+                "bare_metal_billing.config",
+                S3_LEASE_KEY_ID="key-id",
+                S3_LEASE_APP_KEY="app-key",
+            ),
+        ):
+            s3_bucket._get_resource.cache_clear()
+            s3_bucket.get_bucket.cache_clear()
+            s3_bucket.get_bucket("foo-bucket")
+            s3_bucket.get_bucket("bar-bucket")
+            s3_bucket._get_resource.cache_clear()
+            s3_bucket.get_bucket.cache_clear()
+
+        mock_boto3_resource.assert_called_once()
+        self.assertEqual(
+            mock_boto3_resource.return_value.Bucket.call_args_list,
+            [mock.call("foo-bucket"), mock.call("bar-bucket")],
+        )